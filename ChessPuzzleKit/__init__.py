@@ -14,12 +14,16 @@ from .puzzles import (
     get_puzzle_raw,
     get_popularity_range,
     get_rating_range,
+    iter_puzzle,
+    iter_puzzle_raw,
     write_puzzles_to_file,
 )
 
 # Import essential database management functions from the '_db' submodule
 # These are crucial for the user to configure and manage the puzzle database.
 from ._db import (
+    borrow_connection,
+    create_db_from_csv,
     download_default_db,
     set_db_path,
     close_all_connections,
@@ -32,7 +36,9 @@ from ._db import (
 # This controls what is imported when a user types 'from ChessPuzzleKit import *'
 __all__ = [
     # from _db.py
+    "borrow_connection",
     "close_all_connections",
+    "create_db_from_csv",
     "download_default_db",
     "set_db_path",
     "get_connection",
@@ -47,5 +53,7 @@ __all__ = [
     "get_puzzle_by_id",
     "get_puzzle_raw",
     "get_rating_range",
+    "iter_puzzle",
+    "iter_puzzle_raw",
     "write_puzzles_to_file",
 ]
\ No newline at end of file
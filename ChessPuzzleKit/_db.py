@@ -1,15 +1,83 @@
+import csv
+import itertools
 import os
+import queue
 import sqlite3
+import threading
 import psycopg2
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
 # URL for the default chess puzzle database
 DB_URL = 'https://github.com/JackScallan02/chess-puzzle-kit/releases/download/v0.1.0/lichess_db_puzzle.db'
 DEFAULT_PATH = Path.home() / '.chess_puzzles' / 'lichess_db_puzzle.db'
 
+_DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read while downloading
+_DOWNLOAD_WORKERS = 8  # Concurrent byte-range requests for the default database
+# Ask for the raw bytes so nothing is buffered through a decompressor.
+_DOWNLOAD_HEADERS = {"Accept-Encoding": "identity"}
+
+# Idle connections each pool keeps unless CHESSPUZZLEKIT_POOL_SIZE says
+# otherwise; callers beyond this get a temporary one.
+_DEFAULT_POOL_SIZE = 4
+
 _connections = {}  # Cache database connections
+_connections_lock = threading.Lock()  # Guards opening new cached connections
+_pools = {}  # Per-database pools of connections for borrow_connection()
+_borrowed = {}  # Connections currently lent out by borrow_connection(), to their key
 _current_db_path = None  # Global override for DB path/URI
+_current_db_key = None  # _db_key(_current_db_path), computed once in set_db_path()
+_db_caches = {}  # Per-database values derived from the data, e.g. rowid bounds
+
+# SQL types of the numeric Lichess CSV columns; every other column is TEXT.
+_COLUMN_TYPES = {
+    "Rating": "INTEGER",
+    "RatingDeviation": "INTEGER",
+    "Popularity": "INTEGER",
+    "NbPlays": "INTEGER",
+}
+
+# Settings for the one-off CSV import. Durability is pointless while building a
+# fresh file (a failed import is deleted), and these only last for the import's
+# own connection.
+_BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-1048576",  # 1 GiB
+)
+_CSV_BATCH_SIZE = 50000  # Rows held in memory per executemany() call
+
+# Prepared statements kept per SQLite connection (the sqlite3 default is 128).
+# Every filter shape of every public query gets its own entry.
+_STATEMENT_CACHE_SIZE = 1024
+
+# PRAGMAs applied to every SQLite connection. Connections are opened read-only,
+# so there is no journal to tune; give reads a much larger page cache instead.
+_SQLITE_PRAGMAS = (
+    "PRAGMA cache_size=-262144",  # 256 MiB (negative values are KiB)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+)
+
+
+def _pool_size_from_env():
+    """
+    Reads the pool size from CHESSPUZZLEKIT_POOL_SIZE.
+
+    Returns:
+        int: The configured size, at least 1, or `_DEFAULT_POOL_SIZE` if the
+        variable is unset or not an integer.
+    """
+    try:
+        return max(int(os.environ.get("CHESSPUZZLEKIT_POOL_SIZE", str(_DEFAULT_POOL_SIZE))), 1)
+    except ValueError:
+        return _DEFAULT_POOL_SIZE
+
+
+_POOL_SIZE = _pool_size_from_env()
 
 
 def get_database_type(db_connection):
@@ -33,6 +101,21 @@ def get_database_type(db_connection):
         return "unknown"
 
 
+def _configure_conn(conn):
+    """
+    Applies the performance PRAGMAs to a freshly opened SQLite connection.
+
+    Args:
+        conn (sqlite3.Connection): The connection to configure.
+
+    Returns:
+        sqlite3.Connection: The same connection, for chaining.
+    """
+    for pragma in _SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 def set_db_path(db_path_or_uri):
     """
     Sets the global database path or URI for subsequent connections.
@@ -40,26 +123,401 @@ def set_db_path(db_path_or_uri):
     Args:
         db_path_or_uri (str or Path): The path to a SQLite file or a PostgreSQL URI.
     """
-    global _current_db_path
+    global _current_db_path, _current_db_key
     _current_db_path = db_path_or_uri
+    _current_db_key = _db_key(db_path_or_uri)
+    # The file behind this path may have changed since it was last used.
+    _db_caches.pop(_current_db_key, None)
+
+
+def _db_key(path_or_uri):
+    """
+    Returns the key under which connections and caches for a database are kept.
+
+    SQLite paths are resolved, so relative, absolute and symlinked spellings of
+    the same file share one connection, pool and cache.
+
+    Args:
+        path_or_uri (str or Path): The path to a SQLite file or a PostgreSQL URI.
+
+    Returns:
+        str: The cache key.
+    """
+    if not path_or_uri or (
+        isinstance(path_or_uri, str) and path_or_uri.startswith(("postgresql://", "postgres://"))
+    ):
+        return str(path_or_uri)
+    return str(Path(path_or_uri).resolve())
+
+
+def _db_cache():
+    """
+    Returns the cache dict for the currently configured database.
+
+    The cache holds values that are expensive to compute but fixed for a given
+    database file (rowid bounds, column names, ...). It is dropped by
+    `set_db_path()` and `close_all_connections()`.
+
+    Returns:
+        dict: The mutable cache for the current database.
+    """
+    return _db_caches.setdefault(_current_db_key, {})
 
 
 def download_default_db():
     """
     Downloads the default SQLite chess puzzle database to DEFAULT_PATH.
+
+    When the server supports byte-range requests, the file is fetched in
+    several parts concurrently, which is much faster than one stream for a
+    file this size; otherwise it is streamed in a single request.
+
+    The file is written to a `.part` file next to DEFAULT_PATH and only moved
+    into place once complete, so an interrupted download never leaves a
+    truncated database behind.
     """
     print(f"Default database not found. Downloading to {DEFAULT_PATH}...")
     os.makedirs(DEFAULT_PATH.parent, exist_ok=True)
+    part_path = DEFAULT_PATH.with_name(DEFAULT_PATH.name + ".part")
     try:
-        with requests.get(DB_URL, stream=True) as r:
-            r.raise_for_status()
-            with open(DEFAULT_PATH, "wb") as f:
-                for chunk in r.iter_content(8192):
-                    f.write(chunk)
-        if not DEFAULT_PATH.exists():
-             raise FileNotFoundError(f"Database file not found after download attempt at {DEFAULT_PATH}")
-    except requests.exceptions.RequestException as e:
-        raise ConnectionError(f"Failed to download default database: {e}")
+        url, size = _ranged_download_target(DB_URL)
+        if size is None:
+            _download_stream(url, part_path)
+        else:
+            _download_ranges(url, part_path, size)
+        os.replace(part_path, DEFAULT_PATH)
+        # Values cached for a previous copy of the file no longer apply.
+        _db_caches.pop(_db_key(DEFAULT_PATH), None)
+    except BaseException as e:
+        if part_path.exists():
+            part_path.unlink()
+        if isinstance(e, requests.exceptions.RequestException):
+            raise ConnectionError(f"Failed to download default database: {e}")
+        raise
+
+
+def _ranged_download_target(url):
+    """
+    Checks whether `url` can be downloaded with byte-range requests.
+
+    Args:
+        url (str): The URL to download.
+
+    Returns:
+        tuple: (url, size). `url` is the final URL after redirects and `size`
+        its length in bytes, or (url, None) if ranges are not supported or the
+        file is too small to be worth splitting.
+    """
+    r = requests.head(url, allow_redirects=True, headers=_DOWNLOAD_HEADERS)
+    if not r.ok or r.headers.get("Accept-Ranges") != "bytes":
+        return url, None
+    try:
+        size = int(r.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return url, None
+    if size < _DOWNLOAD_WORKERS * _DOWNLOAD_CHUNK_SIZE:
+        return url, None
+    # Release assets redirect to a signed storage URL; request the parts from
+    # it directly rather than following the redirect once per part.
+    return r.url, size
+
+
+def _download_stream(url, path):
+    """
+    Downloads `url` to `path` in a single streamed request.
+    """
+    with requests.get(url, stream=True, headers=_DOWNLOAD_HEADERS) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in r.iter_content(_DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+
+def _download_ranges(url, path, size):
+    """
+    Downloads `url` to `path` as `_DOWNLOAD_WORKERS` concurrent byte ranges.
+
+    The file is preallocated to `size` bytes and each worker writes its range
+    at the matching offset through its own file handle.
+
+    Raises:
+        ConnectionError: If the server ignores a range or a part is incomplete.
+    """
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+    part_size = -(-size // _DOWNLOAD_WORKERS)  # Ceiling division
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+    failed = threading.Event()  # Tells the remaining workers to stop early
+
+    def fetch(start, end):
+        headers = dict(_DOWNLOAD_HEADERS, Range=f"bytes={start}-{end}")
+        try:
+            with requests.get(url, stream=True, headers=headers) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise ConnectionError("Server ignored the byte range request.")
+                with open(path, "r+b") as f:
+                    f.seek(start)
+                    for chunk in r.iter_content(_DOWNLOAD_CHUNK_SIZE):
+                        if failed.is_set():
+                            return
+                        f.write(chunk)
+                    if f.tell() != end + 1:
+                        raise ConnectionError(f"Incomplete download of bytes {start}-{end}.")
+        except BaseException:
+            failed.set()
+            raise
+
+    with ThreadPoolExecutor(max_workers=_DOWNLOAD_WORKERS) as executor:
+        futures = [executor.submit(fetch, start, end) for start, end in ranges]
+    for future in futures:
+        future.result()  # Re-raises the first failure, if any
+
+
+def create_db_from_csv(csv_path, db_path):
+    """
+    Builds an indexed SQLite puzzle database from a Lichess puzzle CSV export.
+
+    The CSV may omit columns. Indexes and derived values are only built from
+    the columns it has, so e.g. a CSV without Themes gives a database with no
+    themes rather than one that mistakes the column name for a value.
+
+    Importing the full Lichess export takes a while. Unless you need a custom
+    CSV, prefer the prebuilt database fetched by `initialize_connection()`,
+    which already contains everything this function builds.
+
+    Args:
+        csv_path (str or Path): Path to the Lichess puzzle CSV, including its
+            header row.
+        db_path (str or Path): Path of the SQLite database file to create.
+
+    Raises:
+        FileExistsError: If a file already exists at `db_path`.
+
+    Returns:
+        Path: The path of the created database.
+    """
+    db_path = Path(db_path)
+    if db_path.exists():
+        raise FileExistsError(f"Refusing to overwrite existing file at '{db_path}'.")
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = ", ".join(f'"{name}" {_COLUMN_TYPES.get(name, "TEXT")}' for name in header)
+        insert_sql = f"INSERT INTO puzzles VALUES ({', '.join('?' * len(header))})"
+        rows = _parse_csv_rows(reader, header)
+
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            for pragma in _BULK_LOAD_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.execute("BEGIN")
+            cursor.execute(f"CREATE TABLE puzzles ({columns})")
+            if not _import_csv_with_extension(conn, csv_path, header):
+                while True:
+                    batch = list(itertools.islice(rows, _CSV_BATCH_SIZE))
+                    if not batch:
+                        break
+                    cursor.executemany(insert_sql, batch)
+            _create_indexes(cursor, header)
+            # The derived tables are prefixed with cpk_, so `puzzles.py` never
+            # mistakes a custom database's own tables of the same name for them.
+            _create_puzzle_themes_table(cursor, header)
+            _create_themes_table(cursor)
+            _create_metadata_table(cursor, header)
+            _create_shuffle_table(cursor)
+            # Statistics for every table and index, so the planner picks index
+            # lookups (and skips e.g. Bloom filters) even on small databases.
+            cursor.execute("ANALYZE")
+            cursor.execute("COMMIT")
+        except BaseException:
+            # Without a journal a failed load cannot be rolled back cleanly.
+            conn.close()
+            db_path.unlink()
+            raise
+        conn.close()
+    return db_path
+
+
+def _import_csv_with_extension(conn, csv_path, header):
+    """
+    Loads the CSV into `puzzles` through SQLite's `csv` virtual-table extension,
+    which parses and inserts rows without a Python round trip per row.
+
+    Rows are checked the same way as by `_parse_csv_rows` before anything is
+    inserted.
+
+    Raises:
+        ValueError: If a row does not have one field per header column, or an
+            integer column holds something other than an integer.
+
+    Returns:
+        bool: False if the extension cannot be loaded, in which case nothing
+        was imported and the caller should insert the rows itself.
+    """
+    try:
+        conn.enable_load_extension(True)
+        try:
+            conn.load_extension("csv")
+        finally:
+            conn.enable_load_extension(False)
+    except (AttributeError, sqlite3.Error):
+        # Python built without extension support, or no csv extension installed.
+        return False
+
+    # Virtual table arguments cannot be bound as parameters.
+    filename = str(Path(csv_path).resolve()).replace("'", "''")
+    # One spare column catches rows with too many fields; the extension leaves
+    # fields missing from short rows NULL (empty fields are '').
+    names = [f"c{i}" for i in range(len(header) + 1)]
+    cursor = conn.cursor()
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE temp.puzzles_csv USING csv(filename='{filename}', header=YES, "
+        f"columns={len(names)}, schema='CREATE TABLE x({', '.join(names)})')"
+    )
+    try:
+        cursor.execute(
+            f"SELECT rowid FROM temp.puzzles_csv WHERE {names[-2]} IS NULL OR {names[-1]} IS NOT NULL LIMIT 1"
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            raise ValueError(f"Malformed CSV row {row[0]}: expected {len(header)} fields.")
+
+        columns = []
+        for name, column in zip(header, names):
+            if _COLUMN_TYPES.get(name) != "INTEGER":
+                columns.append(column)
+                continue
+            # Accept what int() accepts in `_parse_csv_rows`: optional
+            # whitespace and sign around plain digits.
+            digits = f"ltrim(trim({column}), '+-')"
+            cursor.execute(
+                f"SELECT rowid, {column} FROM temp.puzzles_csv WHERE {column} <> '' AND ("
+                f"{digits} = '' OR {digits} GLOB '*[^0-9]*' "
+                f"OR length(trim({column})) - length({digits}) > 1) LIMIT 1"
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                raise ValueError(f"Invalid integer {row[1]!r} for {name} in CSV row {row[0]}.")
+            columns.append(f"CAST(trim(NULLIF({column}, '')) AS INTEGER)")
+
+        cursor.execute(f"INSERT INTO puzzles SELECT {', '.join(columns)} FROM temp.puzzles_csv")
+    finally:
+        cursor.execute("DROP TABLE temp.puzzles_csv")
+    return True
+
+
+def _parse_csv_rows(reader, header):
+    """
+    Yields CSV rows with their integer fields parsed, mapping empty fields to
+    NULL, so they are stored as compact INTEGERs rather than text.
+
+    Raises:
+        ValueError: If a row does not have one field per header column.
+    """
+    integer_fields = [i for i, name in enumerate(header) if _COLUMN_TYPES.get(name) == "INTEGER"]
+    for row in reader:
+        if len(row) != len(header):
+            raise ValueError(
+                f"Malformed CSV row on line {reader.line_num}: "
+                f"expected {len(header)} fields, got {len(row)}."
+            )
+        for i in integer_fields:
+            row[i] = int(row[i]) if row[i] else None
+        yield row
+
+
+def _create_indexes(cursor, header):
+    """
+    Creates the indexes used by the lookups and range filters in `puzzles.py`,
+    for the columns in `header`. SQLite would read a missing column's quoted
+    name as a string literal and index that constant instead.
+    """
+    if "PuzzleId" in header:
+        cursor.execute('CREATE UNIQUE INDEX idx_puzzle_id ON puzzles("PuzzleId")')
+    if "Rating" in header and "Popularity" in header:
+        # Also serves Rating-only filters and MIN/MAX(Rating), and covers combined
+        # rating + popularity filters without touching the table.
+        cursor.execute('CREATE INDEX idx_rating_popularity ON puzzles("Rating", "Popularity")')
+    elif "Rating" in header:
+        cursor.execute('CREATE INDEX idx_rating ON puzzles("Rating")')
+    if "Popularity" in header:
+        cursor.execute('CREATE INDEX idx_popularity ON puzzles("Popularity")')
+
+
+def _create_puzzle_themes_table(cursor, header):
+    """
+    Builds `cpk_puzzle_themes`, one (theme, puzzle_rowid) row per theme of each
+    puzzle. Keyed by theme, so theme filters become index lookups instead of
+    a LIKE scan over every Themes string. Left empty if `header` has no Themes.
+    """
+    # NOCASE matches LIKE's case-insensitivity while keeping the key usable.
+    cursor.execute(
+        "CREATE TABLE cpk_puzzle_themes ("
+        "theme TEXT COLLATE NOCASE, puzzle_rowid INTEGER, "
+        "PRIMARY KEY (theme, puzzle_rowid)) WITHOUT ROWID"
+    )
+    if "Themes" not in header:
+        return
+    puzzles = cursor.connection.execute('SELECT rowid, "Themes" FROM puzzles')
+    pairs = (
+        (theme, rowid) for rowid, theme_string in puzzles if theme_string
+        for theme in theme_string.split()
+    )
+    while True:
+        batch = list(itertools.islice(pairs, _CSV_BATCH_SIZE))
+        if not batch:
+            break
+        cursor.executemany("INSERT OR IGNORE INTO cpk_puzzle_themes (theme, puzzle_rowid) VALUES (?, ?)", batch)
+
+
+def _create_themes_table(cursor):
+    """
+    Builds the `cpk_themes` table listing every distinct theme once, so
+    `get_all_themes` does not have to scan and split the whole puzzles table.
+    """
+    cursor.execute("CREATE TABLE cpk_themes (name TEXT PRIMARY KEY)")
+    cursor.execute("INSERT INTO cpk_themes (name) SELECT DISTINCT theme FROM cpk_puzzle_themes")
+
+
+def _create_metadata_table(cursor, header):
+    """
+    Builds the `cpk_metadata` key/value table holding aggregates that never change
+    for a built database, such as the rating and popularity bounds. The bounds
+    of a column missing from `header` are NULL, as for a column without values.
+    """
+    cursor.execute("CREATE TABLE cpk_metadata (key TEXT PRIMARY KEY, value INTEGER)")
+    for column in ("Rating", "Popularity"):
+        name = column.lower()
+        if column not in header:
+            cursor.executemany(
+                "INSERT INTO cpk_metadata (key, value) VALUES (?, NULL)",
+                [(f"{name}_min",), (f"{name}_max",)],
+            )
+            continue
+        cursor.execute(
+            "INSERT INTO cpk_metadata (key, value) "
+            f'SELECT ?, MIN("{column}") FROM puzzles UNION ALL SELECT ?, MAX("{column}") FROM puzzles',
+            (f"{name}_min", f"{name}_max"),
+        )
+
+
+def _create_shuffle_table(cursor):
+    """
+    Builds `cpk_puzzle_shuffle`, a fixed random permutation of the puzzle
+    rowids. Reading it from a random shuffle_key onwards is an index range scan
+    that yields puzzles in random order, without sorting the table per query.
+    """
+    cursor.execute(
+        "CREATE TABLE cpk_puzzle_shuffle ("
+        "shuffle_key INTEGER PRIMARY KEY, puzzle_rowid INTEGER NOT NULL)"
+    )
+    # shuffle_key is the table's rowid, so keys are assigned 1..N in shuffled order.
+    cursor.execute("INSERT INTO cpk_puzzle_shuffle (puzzle_rowid) SELECT rowid FROM puzzles ORDER BY RANDOM()")
+
 
 def initialize_connection(db_path_or_uri=None):
     """
@@ -102,31 +560,140 @@ def get_connection():
     Returns:
         An active database connection object.
     """
+    path_or_uri = _require_db_path()
+    conn_key = _current_db_key
+
+    conn = _connections.get(conn_key)
+    if conn is not None and _is_alive(conn):
+        return conn
+
+    # Only opening a connection is serialized; cached lookups stay lock-free.
+    with _connections_lock:
+        conn = _connections.get(conn_key)
+        if conn is not None and _is_alive(conn):
+            return conn
+        _connections.pop(conn_key, None)  # Stale connection, remove from cache
+        conn = _open_connection(path_or_uri)
+        _connections[conn_key] = conn
+        return conn
+
+
+@contextmanager
+def borrow_connection():
+    """
+    Borrows a connection from the pool for the current database.
+
+    Each thread gets a connection of its own for the duration of the block,
+    so concurrent callers (e.g. threaded web servers) do not share a cursor
+    or pay the cost of opening a connection per query. SQLite connections
+    return `sqlite3.Row` objects, which support access by index or by column
+    name. Pools keep up to CHESSPUZZLEKIT_POOL_SIZE connections (default 4)
+    open for reuse. When all of them are borrowed, e.g. by unfinished
+    `iter_puzzle` iterators, further callers get a temporary connection that
+    is closed when returned, rather than waiting.
+
+    Raises:
+        ConnectionError: If the connection has not been initialized via
+                         `initialize_connection()` or `set_db_path()`.
+
+    Yields:
+        An active database connection object.
+    """
+    path_or_uri = _require_db_path()
+    conn_key = _current_db_key
+    pool = _pools.get(conn_key)
+    if pool is None:
+        with _connections_lock:
+            pool = _pools.get(conn_key)
+            if pool is None:
+                # Each slot holds an idle connection, or None if not yet opened.
+                pool = queue.LifoQueue()
+                for _ in range(_POOL_SIZE):
+                    pool.put(None)
+                _pools[conn_key] = pool
+
+    try:
+        conn = pool.get_nowait()
+        overflow = False
+    except queue.Empty:
+        conn = None
+        overflow = True
+    try:
+        if conn is None or not _is_alive(conn):
+            conn = None  # Keeps the slot usable if opening fails
+            conn = _open_connection(path_or_uri)
+            if get_database_type(conn) == "sqlite3":
+                # C-level rows allow access by index or column name without
+                # building a dict per row.
+                conn.row_factory = sqlite3.Row
+        with _connections_lock:
+            _borrowed[conn] = conn_key
+        yield conn
+    finally:
+        with _connections_lock:
+            _borrowed.pop(conn, None)
+            # A pool dropped by close_all_connections() must not get it back.
+            keep = not overflow and _pools.get(conn_key) is pool
+        if keep:
+            pool.put(conn)
+        elif conn is not None:
+            conn.close()
+
+
+def _require_db_path():
+    """
+    Returns the configured database path or URI.
+
+    Raises:
+        ConnectionError: If no database has been configured.
+    """
     if not _current_db_path:
         raise ConnectionError(
             "Database connection not initialized. "
             "Please call `initialize_connection()` before trying to connect."
         )
+    return _current_db_path
 
-    path_or_uri = _current_db_path
-    conn_key = str(path_or_uri)
-    
-    if conn_key in _connections and _connections[conn_key]:
-        try:
-            # Ping PostgreSQL connection to check if it's alive
-            if get_database_type(_connections[conn_key]) == "postgresql":
-                _connections[conn_key].cursor().execute("SELECT 1")
-            # SQLite connections are file-based and don't typically "die"
-            return _connections[conn_key]
-        except (psycopg2.InterfaceError, psycopg2.OperationalError):
-            del _connections[conn_key]  # Stale connection, remove from cache
 
+def _is_alive(conn):
+    """
+    Checks whether a cached connection is still usable.
+
+    Args:
+        conn: A cached database connection object.
+
+    Returns:
+        bool: False if a PostgreSQL connection failed its ping, else True.
+    """
+    # SQLite connections are file-based and don't typically "die"
+    if get_database_type(conn) != "postgresql":
+        return True
+    try:
+        # Ping PostgreSQL connection to check if it's alive
+        conn.cursor().execute("SELECT 1")
+        return True
+    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+        return False
+
+
+def _open_connection(path_or_uri):
+    """
+    Opens a new, configured connection to a SQLite file or PostgreSQL URI.
+
+    Args:
+        path_or_uri (str or Path): The path to a SQLite file or a PostgreSQL URI.
+
+    Raises:
+        ConnectionError: If the database cannot be connected to.
+        FileNotFoundError: If the SQLite database file does not exist.
+
+    Returns:
+        An active database connection object.
+    """
     # Handle PostgreSQL connection
     if isinstance(path_or_uri, str) and path_or_uri.startswith(("postgresql://", "postgres://")):
         try:
-            conn = psycopg2.connect(path_or_uri)
-            _connections[conn_key] = conn
-            return conn
+            return psycopg2.connect(path_or_uri)
         except psycopg2.Error as e:
             raise ConnectionError(f"Failed to connect to PostgreSQL: {e}")
 
@@ -134,26 +701,53 @@ def get_connection():
     path = Path(path_or_uri)
     if not path.is_absolute():
        path = Path.cwd() / path
-    
+
     if not path.exists():
         raise FileNotFoundError(f"Database file not found at '{path}'. Please ensure the path is correct.")
 
+    # The library only reads, so open read-only: SQLite then never creates
+    # journal sidecar files. The downloaded default database is never modified
+    # while in use, so it is also declared immutable, which skips file locking.
+    uri = f"{path.as_uri()}?mode=ro"
+    if path == DEFAULT_PATH:
+        uri += "&immutable=1"
+
     try:
-        conn = sqlite3.connect(path)
-        _connections[conn_key] = conn
-        return conn
+        # The connection is shared across threads and only ever reads, so it
+        # runs in autocommit mode rather than opening implicit transactions.
+        return _configure_conn(
+            sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=_STATEMENT_CACHE_SIZE,
+            )
+        )
     except sqlite3.Error as e:
         raise ConnectionError(f"Failed to connect to SQLite database at '{path}': {e}")
 
 
 def close_all_connections():
     """
-    Closes all currently cached database connections.
+    Closes all currently cached database connections, including pooled ones
+    that are still borrowed.
     """
-    global _connections
-    for path, conn in list(_connections.items()):
-        try:
-            conn.close()
-        except Exception as e:
-            print(f"Error closing connection to {path}: {e}")
-    _connections = {}
\ No newline at end of file
+    global _connections, _pools
+    with _connections_lock:
+        idle = list(_connections.items())
+        idle.extend((path, conn) for conn, path in _borrowed.items())
+        _borrowed.clear()
+        for path, pool in _pools.items():
+            while not pool.empty():
+                conn = pool.get_nowait()
+                if conn is not None:
+                    idle.append((path, conn))
+        for path, conn in idle:
+            try:
+                conn.close()
+            except Exception as e:
+                print(f"Error closing connection to {path}: {e}")
+        _connections = {}
+        _pools = {}
+        _db_caches.clear()
\ No newline at end of file
@@ -1,5 +1,11 @@
-import pandas as pd
-from ._db import get_connection, get_database_type
+import csv
+import functools
+import json
+import numbers
+import os
+import random
+import sqlite3
+from ._db import _db_cache, borrow_connection, get_database_type
 
 """
 This module manages reading and filtering Lichess puzzles from a SQLite or PostgreSQL database.
@@ -28,63 +34,545 @@ Usage:
 The database contains the following columns:
 ['PuzzleId', 'FEN', 'Moves', 'Rating', 'RatingDeviation', 'Popularity', 'NbPlays', 'Themes', 'GameUrl', 'OpeningTags']
 """
-def get_puzzle(themes=None, ratingRange=None, popularityRange=None, count=1):
+
+# Rowids drawn per requested puzzle, so gaps in the rowid range (or rows
+# rejected by filters) rarely force a second round trip.
+_ROWID_OVERSAMPLE = 2
+_FILTERED_ROWID_OVERSAMPLE = 10
+_MAX_SAMPLE_ROUNDS = 5
+# Stay below SQLite's bound-parameter limit, leaving room for filter parameters.
+_MAX_ROWID_SAMPLE = 900
+# Distinct filter combinations whose match counts are remembered.
+_MAX_CACHED_COUNTS = 256
+# Per-row forms of the theme filters, for queries that visit few candidate rows.
+_LOOKUP_THEME_FILTERS = {"bridge": "bridge_lookup"}
+# Single random puzzle by rowid; a miss (deleted row) falls back to sampling.
+_FAST_PATH_SQL = "SELECT * FROM puzzles WHERE rowid = ?"
+
+
+def get_puzzle(themes=None, ratingRange=None, popularityRange=None, count=1, sampling="uniform"):
     """
     Retrieves a list of random puzzles based on specified criteria.
 
     Args:
-        themes (list of str, optional): List of themes to filter by. Defaults to None.
+        themes (list or tuple of str, optional): Themes to filter by; a puzzle
+            matches if it has any of them. Matching ignores case. On databases
+            built by `create_db_from_csv` each theme must be one of the puzzle's
+            whole themes, so "mate" does not match "mateIn2". Other databases,
+            including PostgreSQL, match it anywhere in the Themes string, so
+            "mate" also matches "mateIn2". Defaults to None.
         ratingRange (tuple of int, optional): (min_rating, max_rating). Defaults to None.
         popularityRange (tuple of int, optional): (min_popularity, max_popularity). Defaults to None.
         count (int, optional): Number of puzzles to return. Defaults to 1.
+        sampling (str, optional): "uniform" picks each puzzle independently at
+            random. "contiguous" returns a run of `count` consecutive matching
+            puzzles from a random starting point, which is much cheaper for large
+            `count` (e.g. bulk exports) but not an independent sample. On
+            databases built by `create_db_from_csv` the run is taken from a fixed
+            random shuffle of the puzzles, so it is still in random order.
+            Defaults to "uniform".
 
     Returns:
         list: A list of puzzle dictionaries matching the criteria.
     """
-    conn = get_connection()
-    db_type = get_database_type(conn)
+    return list(iter_puzzle(themes, ratingRange, popularityRange, count, sampling))
 
-    if themes is not None and not isinstance(themes, list):
-        raise TypeError("Themes must be a list of strings.")
-    if ratingRange is not None and (
-        not isinstance(ratingRange, (list, tuple)) or len(ratingRange) != 2
-        or not all(isinstance(x, int) for x in ratingRange)
-    ):
-        raise TypeError("ratingRange must be a list or tuple of two integers.")
-    if popularityRange is not None and (
-        not isinstance(popularityRange, (list, tuple)) or len(popularityRange) != 2
-        or not all(isinstance(x, int) for x in popularityRange)
+
+def iter_puzzle(themes=None, ratingRange=None, popularityRange=None, count=1, sampling="uniform"):
+    """
+    Like `get_puzzle`, but yields the puzzles one at a time instead of
+    returning a list, e.g. to stream a large `count` into
+    `write_puzzles_to_file`. The arguments are validated immediately; the
+    pooled connection is held until the iterator is exhausted or closed.
+
+    Args:
+        themes (list or tuple of str, optional): Themes to filter by, matched
+            as described in `get_puzzle`. Defaults to None.
+        ratingRange (tuple of int, optional): (min_rating, max_rating). Defaults to None.
+        popularityRange (tuple of int, optional): (min_popularity, max_popularity). Defaults to None.
+        count (int, optional): Number of puzzles to return. Defaults to 1.
+        sampling (str, optional): "uniform" or "contiguous", see `get_puzzle`.
+            Defaults to "uniform".
+
+    Returns:
+        iterator of dict: The puzzles matching the criteria.
+    """
+    # Validate before borrowing a connection, so bad arguments never touch the database.
+    ratingRange, popularityRange, count = _validate_get_puzzle_args(
+        themes, ratingRange, popularityRange, count, sampling
+    )
+    return _iter_puzzle(themes, ratingRange, popularityRange, count, sampling)
+
+
+def _iter_puzzle(themes, ratingRange, popularityRange, count, sampling):
+    """
+    Generator behind `iter_puzzle`, for already validated arguments.
+    """
+    with borrow_connection() as conn:
+        db_type = get_database_type(conn)
+
+        # Fast path for the default call: one rowid lookup, no SQL building.
+        if (
+            themes is None and ratingRange is None and popularityRange is None
+            and count == 1 and sampling == "uniform" and db_type == "sqlite3"
+        ):
+            bounds = _rowid_bounds(conn)
+            if bounds is not None and bounds[0] is not None:
+                cursor = conn.cursor()
+                cursor.execute(_FAST_PATH_SQL, (random.randint(*bounds),))
+                row = cursor.fetchone()
+                if row is not None:
+                    yield dict(zip(_puzzle_columns(conn), row))
+                    return
+
+        theme_filter = None
+        params = []
+        if themes:
+            if _has_table(conn, "cpk_puzzle_themes"):
+                theme_filter = "bridge"
+                params.extend(themes)
+            else:
+                theme_filter = "like"
+                params.extend([f"%{t}%" for t in themes])
+
+        rating_expr = None
+        if ratingRange:
+            rating_expr = _integer_column(conn, "Rating")
+            params.extend(ratingRange)
+
+        popularity_expr = None
+        if popularityRange:
+            popularity_expr = _integer_column(conn, "Popularity")
+            params.extend(popularityRange)
+
+        # Identical SQL text for identical filter shapes lets the driver reuse its
+        # prepared statement instead of re-parsing and re-planning the query.
+        num_themes = len(themes) if themes else 0
+        filters = _puzzle_filters(db_type, theme_filter, num_themes, rating_expr, popularity_expr)
+        # Sampling visits few rows, so checking each of them against the theme
+        # tables beats listing every themed puzzle up front.
+        lookup_filters = _puzzle_filters(
+            db_type, _LOOKUP_THEME_FILTERS.get(theme_filter, theme_filter),
+            num_themes, rating_expr, popularity_expr,
+        )
+        cursor = conn.cursor()
+
+        if sampling == "contiguous":
+            total = _count_matches(conn, filters, params)
+            # With more matches than requested, reading on from a random point of
+            # the shuffle visits about count * rows / total rows; otherwise every
+            # match is returned below anyway.
+            if total > count and _has_table(conn, "cpk_puzzle_shuffle"):
+                yield from _sample_by_shuffle_key(conn, count, lookup_filters, params)
+                return
+            params.extend([count, random.randint(0, max(total - count, 0))])
+        else:
+            if db_type == "sqlite3":
+                puzzles = _sample_by_rowid(conn, count, lookup_filters, params)
+                if puzzles is not None:
+                    yield from puzzles
+                    return
+            params.append(count)
+
+        by_rowid = db_type == "sqlite3" and _rowid_bounds(conn) is not None
+        cursor.execute(_get_puzzle_query(db_type, sampling, filters, by_rowid), params)
+        columns = _puzzle_columns(conn)
+        # Build each dict straight from the cursor instead of materializing every
+        # row tuple first with fetchall().
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+
+def _validate_get_puzzle_args(themes, ratingRange, popularityRange, count, sampling):
+    """
+    Checks the arguments of `get_puzzle` without touching the database.
+
+    Integer arguments may be of any integral type (e.g. numpy.int64 taken from
+    a DataFrame) and are converted to plain ints, which every driver can bind.
+    Booleans are rejected.
+
+    Raises:
+        TypeError: If themes or a range has the wrong type.
+        ValueError: If count or sampling has an invalid value.
+
+    Returns:
+        tuple: (ratingRange, popularityRange, count) with int values.
+    """
+    if themes is not None and (
+        not isinstance(themes, (list, tuple)) or not all(isinstance(t, str) for t in themes)
     ):
-        raise TypeError("popularityRange must be a list or tuple of two integers.")
-    if not isinstance(count, int) or count <= 0:
+        raise TypeError("Themes must be a list of strings.")
+    if ratingRange is not None:
+        if not isinstance(ratingRange, (list, tuple)) or len(ratingRange) != 2 or not all(
+            _is_integer(x) for x in ratingRange
+        ):
+            raise TypeError("ratingRange must be a list or tuple of two integers.")
+        ratingRange = tuple(int(x) for x in ratingRange)
+    if popularityRange is not None:
+        if not isinstance(popularityRange, (list, tuple)) or len(popularityRange) != 2 or not all(
+            _is_integer(x) for x in popularityRange
+        ):
+            raise TypeError("popularityRange must be a list or tuple of two integers.")
+        popularityRange = tuple(int(x) for x in popularityRange)
+    if not _is_integer(count) or count <= 0:
         raise ValueError("Count must be a positive integer.")
+    if sampling not in ("uniform", "contiguous"):
+        raise ValueError("sampling must be 'uniform' or 'contiguous'.")
+    return ratingRange, popularityRange, int(count)
 
-    placeholder = "?" if db_type == "sqlite3" else "%s"
-    query = 'SELECT * FROM puzzles WHERE 1=1'
-    params = []
 
-    if themes:
+def _is_integer(value):
+    """
+    Returns True for integral values (int, numpy integers, ...) other than bool.
+    """
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool)
+
+
+@functools.lru_cache(maxsize=None)
+def _puzzle_filters(db_type, theme_filter, num_themes, rating_expr, popularity_expr):
+    """
+    Builds the WHERE-clause filters for a `get_puzzle` call of a given shape.
+
+    Args:
+        db_type (str): "sqlite3" or "postgresql".
+        theme_filter (str or None): "bridge", "like", or None for no theme
+            filter. "bridge_lookup" is the "bridge" filter checked once per
+            candidate row, for queries that visit only a few rows.
+        num_themes (int): Number of themes passed to a "bridge", "bridge_lookup"
+            or "like" filter.
+        rating_expr (str or None): Integer expression for Rating, if filtered.
+        popularity_expr (str or None): Integer expression for Popularity, if filtered.
+
+    Returns:
+        str: Zero or more " AND ..." conditions, to follow "WHERE 1=1".
+    """
+    placeholder = "?" if db_type == "sqlite3" else "%s"
+    filters = ""
+
+    if theme_filter == "bridge":
+        theme_placeholders = ", ".join([placeholder] * num_themes)
+        filters += (
+            " AND puzzles.rowid IN (SELECT puzzle_rowid FROM cpk_puzzle_themes "
+            f"WHERE theme IN ({theme_placeholders}))"
+        )
+    elif theme_filter == "bridge_lookup":
+        # Probes the bridge table's key once per candidate row, rather than
+        # listing every puzzle with the themes up front.
+        theme_placeholders = ", ".join([placeholder] * num_themes)
+        filters += (
+            " AND EXISTS (SELECT 1 FROM cpk_puzzle_themes "
+            f"WHERE theme IN ({theme_placeholders}) AND puzzle_rowid = puzzles.rowid)"
+        )
+    elif theme_filter == "like":
         like_operator = "LIKE" if db_type == "sqlite3" else "ILIKE"
-        theme_conditions = [f'"Themes" {like_operator} {placeholder}'] * len(themes)
-        query += " AND (" + " OR ".join(theme_conditions) + ")"
-        params.extend([f"%{t}%" for t in themes])
+        theme_conditions = [f'"Themes" {like_operator} {placeholder}'] * num_themes
+        filters += " AND (" + " OR ".join(theme_conditions) + ")"
+
+    if rating_expr:
+        filters += f" AND {rating_expr} BETWEEN {placeholder} AND {placeholder}"
+
+    if popularity_expr:
+        filters += f" AND {popularity_expr} BETWEEN {placeholder} AND {placeholder}"
+
+    return filters
+
+
+@functools.lru_cache(maxsize=None)
+def _get_puzzle_query(db_type, sampling, filters, by_rowid=True):
+    """
+    Builds the SQL for a `get_puzzle` call.
+
+    Args:
+        db_type (str): "sqlite3" or "postgresql".
+        sampling (str): "uniform" or "contiguous".
+        filters (str): Conditions from `_puzzle_filters`.
+        by_rowid (bool, optional): Whether a SQLite `puzzles` table has usable
+            rowids (views and WITHOUT ROWID tables do not). Defaults to True.
+
+    Returns:
+        str: The query, taking the filter parameters followed by the count
+        (and, for "contiguous", the offset).
+    """
+    placeholder = "?" if db_type == "sqlite3" else "%s"
+    if sampling == "contiguous":
+        return f"SELECT * FROM puzzles WHERE 1=1{filters} LIMIT {placeholder} OFFSET {placeholder}"
+    if db_type == "sqlite3" and by_rowid:
+        # Shuffle only the matching rowids, then fetch the chosen rows by key.
+        return (
+            f"WITH candidates AS (SELECT rowid FROM puzzles WHERE 1=1{filters}) "
+            "SELECT * FROM puzzles WHERE rowid IN "
+            "(SELECT rowid FROM candidates ORDER BY RANDOM() LIMIT ?) "
+            "ORDER BY RANDOM()"
+        )
+    return f"SELECT * FROM puzzles WHERE 1=1{filters} ORDER BY RANDOM() LIMIT {placeholder}"
+
+
+def _count_matches(conn, filters, params):
+    """
+    Returns how many puzzles match `filters`, cached per database.
+    """
+    counts = _db_cache().setdefault("match_counts", {})
+    key = (filters, tuple(params))
+    if key not in counts:
+        if len(counts) >= _MAX_CACHED_COUNTS:
+            counts.clear()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM puzzles WHERE 1=1{filters}", params)
+        counts[key] = cursor.fetchone()[0]
+    return counts[key]
+
+
+def _has_table(conn, name):
+    """
+    Checks whether the SQLite database defines the table `name`. The optional
+    tables built by `create_db_from_csv` are only used when present.
+    """
+    if get_database_type(conn) != "sqlite3":
+        return False
+    cache = _db_cache()
+    if "tables" not in cache:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        cache["tables"] = {row[0] for row in cursor.fetchall()}
+    return name in cache["tables"]
+
 
-    if ratingRange:
-        query += f' AND CAST("Rating" AS INTEGER) BETWEEN {placeholder} AND {placeholder}'
-        params.extend(ratingRange)
+def _integer_column(conn, column):
+    """
+    Returns an SQL expression reading `column` as an integer.
+
+    Databases built with INTEGER columns are compared directly so SQLite can use
+    their indexes; TEXT columns (and PostgreSQL) keep the explicit CAST.
+    """
+    if get_database_type(conn) == "sqlite3" and "INT" in _column_types(conn).get(column, ""):
+        return f'"{column}"'
+    return f'CAST("{column}" AS INTEGER)'
 
-    if popularityRange:
-        query += f' AND CAST("Popularity" AS INTEGER) BETWEEN {placeholder} AND {placeholder}'
-        params.extend(popularityRange)
 
-    random_func = "RANDOM()"
-    query += f" ORDER BY {random_func} LIMIT {placeholder}"
-    params.append(count)
+def _column_types(conn):
+    """
+    Returns the puzzles table's columns, in table order, mapped to their
+    upper-cased declared types. Read once per database, since the schema of
+    the puzzle database does not change.
+    """
+    cache = _db_cache()
+    if "columns" not in cache:
+        db_type = get_database_type(conn)
+        cursor = conn.cursor()
+        if db_type == "sqlite3":
+            cursor.execute("PRAGMA table_info(puzzles)")
+            # The column name and type are in the second and third positions
+            cache["columns"] = {row[1]: row[2].upper() for row in cursor.fetchall()}
+        elif db_type == "postgresql":
+            query = (
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_name = 'puzzles' ORDER BY ordinal_position;"
+            )
+            cursor.execute(query)
+            cache["columns"] = {row[0]: row[1].upper() for row in cursor.fetchall()}
+        else:
+            cache["columns"] = {}
+    return cache["columns"]
+
+
+def _puzzle_columns(conn):
+    """
+    Returns the column names of `SELECT * FROM puzzles` rows as a tuple.
+    """
+    cache = _db_cache()
+    if "column_names" not in cache:
+        cache["column_names"] = tuple(_column_types(conn))
+    return cache["column_names"]
+
+
+def _metadata(conn):
+    """
+    Returns the rating and popularity bounds of the database as a dict with keys
+    "rating_min", "rating_max", "popularity_min" and "popularity_max".
+
+    Fetched with a single query and cached per database. Databases built by
+    `create_db_from_csv` store these values in `cpk_metadata`; otherwise each
+    bound is its own subquery, so SQLite can read it from the edge of an index.
+    """
+    cache = _db_cache()
+    if "metadata" not in cache:
+        keys = ("rating_min", "rating_max", "popularity_min", "popularity_max")
+        cursor = conn.cursor()
+        metadata = {}
+        if _has_table(conn, "cpk_metadata"):
+            cursor.execute("SELECT key, value FROM cpk_metadata")
+            metadata = {key: value for key, value in cursor.fetchall()}
+        if all(key in metadata for key in keys):
+            cache["metadata"] = metadata
+        else:
+            rating = _integer_column(conn, "Rating")
+            popularity = _integer_column(conn, "Popularity")
+            cursor.execute(
+                f"SELECT (SELECT MIN({rating}) FROM puzzles), (SELECT MAX({rating}) FROM puzzles), "
+                f"(SELECT MIN({popularity}) FROM puzzles), (SELECT MAX({popularity}) FROM puzzles)"
+            )
+            cache["metadata"] = dict(zip(keys, cursor.fetchone()))
+    return cache["metadata"]
+
+
+def _rowid_bounds(conn):
+    """
+    Returns the (min_rowid, max_rowid) of the puzzles table, cached per database.
+
+    Returns:
+        tuple or None: The bounds, (None, None) if the table is empty, or None
+        if `puzzles` has no usable rowids (a view or a WITHOUT ROWID table), in
+        which case puzzles must not be looked up by rowid.
+    """
+    cache = _db_cache()
+    if "rowid_bounds" not in cache:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MIN(rowid), MAX(rowid) FROM puzzles")
+            bounds = tuple(cursor.fetchone())
+        except sqlite3.OperationalError:  # WITHOUT ROWID: no rowid column
+            bounds = None
+        if bounds is not None and bounds[0] is None:
+            # Views report NULL rowids, so only an empty result means no puzzles.
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM puzzles)")
+            if cursor.fetchone()[0]:
+                bounds = None
+        cache["rowid_bounds"] = bounds
+    return cache["rowid_bounds"]
+
+
+def _sample_by_rowid(conn, count, filters="", params=()):
+    """
+    Picks random puzzles by looking up random rowids through the primary key,
+    avoiding a full-table `ORDER BY RANDOM()` sort. SQLite only.
+
+    Filters are applied to the sampled rows in the same query, and rows they
+    reject are topped up from fresh samples. This suits filters that match a
+    large share of the table; for selective ones sampling gives up after a few
+    rounds and the caller falls back to shuffling the matching rowids.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        count (int): Number of puzzles to return.
+        filters (str, optional): Conditions from `_puzzle_filters`.
+        params (list, optional): Parameters for `filters`.
+
+    Returns:
+        list or None: A list of puzzle dictionaries, or None if sampling is
+        not possible or worthwhile or did not find enough matches, and the
+        caller should fall back to sorting.
+    """
+    bounds = _rowid_bounds(conn)
+    if bounds is None:
+        return None
+    low, high = bounds
+    if low is None:
+        return []
+    span = high - low + 1
+    sample_size = count * (_FILTERED_ROWID_OVERSAMPLE if filters else _ROWID_OVERSAMPLE)
+    if sample_size > span or sample_size > _MAX_ROWID_SAMPLE:
+        return None
+
+    use_json = _supports_json_each(conn)
+    cursor = conn.cursor()
+    found = {}
+    for _ in range(_MAX_SAMPLE_ROUNDS):
+        # Re-sample to replace rowids that fell into gaps left by deleted rows
+        # or that did not pass the filters.
+        candidates = [
+            rowid for rowid in random.sample(range(low, high + 1), sample_size)
+            if rowid not in found
+        ]
+        if use_json:
+            cursor.execute(_rowid_sample_query(filters, None), [json.dumps(candidates), *params])
+        else:
+            cursor.execute(_rowid_sample_query(filters, len(candidates)), [*candidates, *params])
+        rows = {row[0]: row[1:] for row in cursor}
+        for rowid in candidates:
+            if rowid in rows and len(found) < count:
+                found[rowid] = rows[rowid]
+        if len(found) == count:
+            columns = _puzzle_columns(conn)
+            return [dict(zip(columns, row)) for row in found.values()]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _rowid_sample_query(filters, num_rowids):
+    """
+    Builds the `_sample_by_rowid` query for `num_rowids` rowid parameters, or,
+    if `num_rowids` is None, for one JSON array of rowids. The JSON form has the
+    same SQL text for every sample size, so its prepared statement is reused.
+    """
+    if num_rowids is None:
+        rowids = "SELECT value FROM json_each(?)"
+    else:
+        rowids = ",".join("?" * num_rowids)
+    return f"SELECT rowid, * FROM puzzles WHERE rowid IN ({rowids}){filters}"
+
+
+def _supports_json_each(conn):
+    """
+    Checks once per database whether SQLite was built with the JSON functions
+    (standard since SQLite 3.38).
+    """
+    cache = _db_cache()
+    if "json_each" not in cache:
+        try:
+            conn.execute("SELECT value FROM json_each('[1]')").fetchall()
+            cache["json_each"] = True
+        except sqlite3.OperationalError:
+            cache["json_each"] = False
+    return cache["json_each"]
+
+
+def _sample_by_shuffle_key(conn, count, filters, params):
+    """
+    Returns the first `count` matching puzzles at or after a random position in
+    the `cpk_puzzle_shuffle` permutation, wrapping around to its start if too
+    few follow. Both reads are range scans of the shuffle table's primary key,
+    so no query sorts or counts the matching puzzles. SQLite only.
+
+    Args:
+        conn (sqlite3.Connection): An active SQLite connection.
+        count (int): Number of puzzles to return.
+        filters (str): Conditions from `_puzzle_filters`.
+        params (list): Parameters for `filters`.
+
+    Returns:
+        list: A list of puzzle dictionaries.
+    """
+    cache = _db_cache()
+    if "shuffle_size" not in cache:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(shuffle_key) FROM cpk_puzzle_shuffle")
+        cache["shuffle_size"] = cursor.fetchone()[0] or 0
+    start = random.randint(1, max(cache["shuffle_size"], 1))
 
     cursor = conn.cursor()
-    cursor.execute(query, params)
-    columns = [desc[0] for desc in cursor.description]
-    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    cursor.execute(_shuffle_query(filters, wrapped=False), [start, *params, count])
+    rows = cursor.fetchall()
+    if len(rows) < count:
+        cursor.execute(_shuffle_query(filters, wrapped=True), [start, *params, count - len(rows)])
+        rows.extend(cursor.fetchall())
+    columns = _puzzle_columns(conn)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+@functools.lru_cache(maxsize=None)
+def _shuffle_query(filters, wrapped):
+    """
+    Builds the `_sample_by_shuffle_key` query, reading from a shuffle_key
+    onwards, or (`wrapped`) from the start up to it.
+    """
+    # CROSS JOIN keeps cpk_puzzle_shuffle as the outer loop, so rows come out
+    # in shuffle_key order and the scan stops after LIMIT matches.
+    return (
+        "SELECT puzzles.* FROM cpk_puzzle_shuffle CROSS JOIN puzzles "
+        "ON puzzles.rowid = cpk_puzzle_shuffle.puzzle_rowid "
+        f"WHERE cpk_puzzle_shuffle.shuffle_key {'<' if wrapped else '>='} ?{filters} "
+        "ORDER BY cpk_puzzle_shuffle.shuffle_key LIMIT ?"
+    )
 
 
 def get_puzzle_raw(query, params=None):
@@ -98,11 +586,35 @@ def get_puzzle_raw(query, params=None):
     Returns:
         list: A list of dictionaries representing the query result.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params or ())
-    columns = [col[0] for col in cursor.description]
-    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return list(iter_puzzle_raw(query, params))
+
+
+def iter_puzzle_raw(query, params=None, chunksize=10000):
+    """
+    Executes a raw SQL query and yields result rows one at a time.
+
+    Rows are fetched from the database `chunksize` at a time, so large results
+    (e.g. `SELECT * FROM puzzles`) are never held in memory all at once. The
+    pooled connection is held until the iterator is exhausted or closed.
+
+    Args:
+        query (str): The SQL query to execute.
+        params (tuple, optional): The parameters to substitute into the query.
+        chunksize (int, optional): Rows fetched per round trip. Defaults to 10000.
+
+    Yields:
+        dict: One dictionary per result row.
+    """
+    with borrow_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params or ())
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
 
 
 def get_puzzle_by_id(puzzle_id):
@@ -118,35 +630,56 @@ def get_puzzle_by_id(puzzle_id):
     if not isinstance(puzzle_id, str):
         raise TypeError("PuzzleId must be a string.")
 
-    conn = get_connection()
-    db_type = get_database_type(conn)
-    placeholder = "?" if db_type == "sqlite3" else "%s"
+    with borrow_connection() as conn:
+        db_type = get_database_type(conn)
+        placeholder = "?" if db_type == "sqlite3" else "%s"
 
-    cursor = conn.cursor()
-    query = f'SELECT * FROM puzzles WHERE "PuzzleId" = {placeholder}'
-    cursor.execute(query, (puzzle_id,))
-    row = cursor.fetchone()
+        cursor = conn.cursor()
+        query = f'SELECT * FROM puzzles WHERE "PuzzleId" = {placeholder}'
+        cursor.execute(query, (puzzle_id,))
+        row = cursor.fetchone()
 
-    if row:
-        columns = [col[0] for col in cursor.description]
-        return dict(zip(columns, row))
-    return None
+        if row:
+            return dict(zip(_puzzle_columns(conn), row))
+        return None
 
 
 def get_all_themes():
     """
-    Retrieves all unique puzzle themes from the database.
+    Retrieves all unique puzzle themes from the database. The themes are read
+    once per database and cached.
 
     Returns:
         set: A set of all available theme strings.
     """
-    conn = get_connection()
-    query = 'SELECT DISTINCT "Themes" FROM puzzles'
+    with borrow_connection() as conn:
+        cache = _db_cache()
+        if "themes" not in cache:
+            cache["themes"] = frozenset(_load_themes(conn))
+    # A copy, so callers can modify the result without touching the cache.
+    return set(cache["themes"])
+
+
+def _load_themes(conn):
+    """
+    Reads the set of distinct themes, from the `cpk_themes` or `cpk_puzzle_themes`
+    table when present, otherwise by splitting every Themes string.
+    """
     cursor = conn.cursor()
+    if _has_table(conn, "cpk_themes"):
+        cursor.execute("SELECT name FROM cpk_themes")
+        return {row[0] for row in cursor}
+    if _has_table(conn, "cpk_puzzle_themes"):
+        # An index-only scan over the bridge table's key.
+        cursor.execute("SELECT DISTINCT theme FROM cpk_puzzle_themes")
+        return {row[0] for row in cursor}
+
+    query = 'SELECT DISTINCT "Themes" FROM puzzles'
     cursor.execute(query)
-    
+
+    # Iterate the cursor rather than fetchall() so only one row is held at a time.
     themes = set()
-    for row in cursor.fetchall():
+    for row in cursor:
         if row[0]:
             themes.update(row[0].split(' '))
     return themes
@@ -159,11 +692,9 @@ def get_rating_range():
     Returns:
         tuple: (min_rating, max_rating).
     """
-    conn = get_connection()
-    query = 'SELECT MIN(CAST("Rating" AS INTEGER)), MAX(CAST("Rating" AS INTEGER)) FROM puzzles'
-    cursor = conn.cursor()
-    cursor.execute(query)
-    return cursor.fetchone()
+    with borrow_connection() as conn:
+        metadata = _metadata(conn)
+    return metadata["rating_min"], metadata["rating_max"]
 
 
 def get_popularity_range():
@@ -173,11 +704,9 @@ def get_popularity_range():
     Returns:
         tuple: (min_popularity, max_popularity).
     """
-    conn = get_connection()
-    query = 'SELECT MIN(CAST("Popularity" AS INTEGER)), MAX(CAST("Popularity" AS INTEGER)) FROM puzzles'
-    cursor = conn.cursor()
-    cursor.execute(query)
-    return cursor.fetchone()
+    with borrow_connection() as conn:
+        metadata = _metadata(conn)
+    return metadata["popularity_min"], metadata["popularity_max"]
 
 
 def get_puzzle_attributes():
@@ -187,39 +716,70 @@ def get_puzzle_attributes():
     Returns:
         set: A set of attribute (column) names.
     """
-    conn = get_connection()
-    db_type = get_database_type(conn)
-    cursor = conn.cursor()
-    
-    if db_type == "sqlite3":
-        query = "PRAGMA table_info(puzzles)"
-        cursor.execute(query)
-        # The column name is in the second position (index 1)
-        return {row[1] for row in cursor.fetchall()}
-    elif db_type == "postgresql":
-        query = "SELECT column_name FROM information_schema.columns WHERE table_name = 'puzzles';"
-        cursor.execute(query)
-        return {row[0] for row in cursor.fetchall()}
-    else:
-        return set()
+    with borrow_connection() as conn:
+        return set(_column_types(conn))
 
 
 def write_puzzles_to_file(puzzles, file_path, header=True):
     """
-    Writes a list of puzzle dictionaries to a CSV file.
+    Writes a list of puzzles to a CSV file.
+
+    Puzzles may be dictionaries or `sqlite3.Row` objects, e.g. rows fetched
+    on a connection from `borrow_connection()`. A list made up only of rows
+    from one query is written as-is, without converting each row to a dict.
+
+    Other iterables, such as the iterator returned by `iter_puzzle`, are
+    written as they are consumed, so only one puzzle is held in memory at a
+    time. Their columns are taken from the first puzzle.
 
     Args:
-        puzzles (list of dict): The list of puzzles to write.
+        puzzles (list or iterable of dict or sqlite3.Row): The puzzles to write.
         file_path (str or Path): The path to the output CSV file.
         header (bool, optional): Whether to write the column headers. Defaults to True.
     """
-    if not isinstance(puzzles, list):
+    if isinstance(puzzles, (str, bytes, dict)) or not hasattr(puzzles, "__iter__"):
         raise TypeError("Puzzles must be a list of dictionaries.")
-    if puzzles and not all(isinstance(puzzle, dict) for puzzle in puzzles):
-        raise TypeError("Each item in the puzzles list must be a dictionary.")
+    is_list = isinstance(puzzles, list)
+    if is_list and not all(isinstance(puzzle, (dict, sqlite3.Row)) for puzzle in puzzles):
+        raise TypeError("Each item in the puzzles list must be a dictionary or sqlite3.Row.")
 
-    df = pd.DataFrame(puzzles)
     try:
-        df.to_csv(file_path, index=False, encoding='utf-8', header=header)
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            if not is_list:
+                _write_puzzle_stream(f, puzzles, header)
+                return
+
+            if puzzles and all(isinstance(puzzle, sqlite3.Row) for puzzle in puzzles):
+                writer = csv.writer(f, lineterminator=os.linesep)
+                if header:
+                    writer.writerow(puzzles[0].keys())
+                writer.writerows(puzzles)
+                return
+
+            puzzles = [dict(zip(p.keys(), p)) if isinstance(p, sqlite3.Row) else p for p in puzzles]
+            # Union of keys in first-seen order, so puzzles with extra keys still fit.
+            fieldnames = list(dict.fromkeys(key for puzzle in puzzles for key in puzzle))
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator=os.linesep)
+            if header:
+                writer.writeheader()
+            writer.writerows(puzzles)
     except IOError as e:
-        raise IOError(f"Error writing to file {file_path}: {e}")
\ No newline at end of file
+        raise IOError(f"Error writing to file {file_path}: {e}")
+
+
+def _write_puzzle_stream(f, puzzles, header):
+    """
+    Writes puzzles from an iterable to an open CSV file one at a time, using
+    the keys of the first puzzle as the columns.
+    """
+    writer = None
+    for puzzle in puzzles:
+        if isinstance(puzzle, sqlite3.Row):
+            puzzle = dict(zip(puzzle.keys(), puzzle))
+        elif not isinstance(puzzle, dict):
+            raise TypeError("Each item in the puzzles list must be a dictionary or sqlite3.Row.")
+        if writer is None:
+            writer = csv.DictWriter(f, fieldnames=list(puzzle), lineterminator=os.linesep)
+            if header:
+                writer.writeheader()
+        writer.writerow(puzzle)
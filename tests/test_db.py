@@ -0,0 +1,445 @@
+import pytest
+import requests
+import sqlite3
+import threading
+from contextlib import closing
+import chesspuzzlekit as cpk
+
+
+def test_sqlite_connection_pragmas():
+    conn = cpk.get_connection()
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -262144
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+
+def test_connection_shared_across_threads():
+    conn = cpk.get_connection()
+    results = []
+
+    def worker():
+        results.append((cpk.get_connection() is conn, len(cpk.get_puzzle())))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(True, 1)] * 4
+
+
+def test_connection_shared_across_path_spellings(test_db, monkeypatch):
+    monkeypatch.chdir(test_db.parent)
+    try:
+        cpk.set_db_path(test_db.name)
+        relative = cpk.get_connection()
+        cpk.set_db_path(str(test_db))
+        assert cpk.get_connection() is relative
+    finally:
+        cpk.set_db_path(test_db)
+
+
+def test_borrow_connection_reuses_pooled_connections():
+    with cpk.borrow_connection() as first:
+        with cpk.borrow_connection() as second:
+            assert first is not second
+    with cpk.borrow_connection() as again:
+        assert again is first
+        assert again.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0] == 6
+
+
+def test_borrow_connection_does_not_block_when_pool_is_exhausted():
+    iterators = [cpk.iter_puzzle_raw("SELECT * FROM puzzles", chunksize=1) for _ in range(5)]
+    for iterator in iterators:
+        next(iterator)
+    try:
+        assert len(cpk.get_puzzle()) == 1
+    finally:
+        for iterator in iterators:
+            iterator.close()
+
+
+@pytest.mark.parametrize("value, size", [("8", 8), ("0", 1), ("many", 4), (None, 4)])
+def test_pool_size_from_env(monkeypatch, value, size):
+    if value is None:
+        monkeypatch.delenv("CHESSPUZZLEKIT_POOL_SIZE", raising=False)
+    else:
+        monkeypatch.setenv("CHESSPUZZLEKIT_POOL_SIZE", value)
+    assert cpk._db._pool_size_from_env() == size
+
+
+def test_close_all_connections_closes_borrowed_connections():
+    with cpk.borrow_connection() as conn:
+        cpk.close_all_connections()
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert len(cpk.get_puzzle()) == 1
+
+
+def test_borrow_connection_requires_initialization(test_db):
+    cpk.set_db_path(None)
+    try:
+        with pytest.raises(ConnectionError, match="not initialized"):
+            with cpk.borrow_connection():
+                pass
+    finally:
+        cpk.set_db_path(test_db)
+
+
+def test_sqlite_connection_is_read_only():
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        cpk.get_puzzle_raw("DELETE FROM puzzles")
+
+
+def test_sqlite_connection_creates_no_sidecar_files(test_db):
+    cpk.get_puzzle(count=2)
+    assert sorted(path.name for path in test_db.parent.iterdir()) == [test_db.name]
+
+
+@pytest.fixture
+def built_db(tmp_path, sample_puzzles_df):
+    csv_path = tmp_path / "puzzles.csv"
+    sample_puzzles_df.to_csv(csv_path, index=False)
+    return cpk.create_db_from_csv(csv_path, tmp_path / "built.db")
+
+
+def test_create_db_from_csv(built_db, sample_puzzles_df):
+    with closing(sqlite3.connect(built_db)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0] == len(sample_puzzles_df)
+        column_types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(puzzles)")}
+        assert column_types["Rating"] == "INTEGER"
+        assert column_types["Themes"] == "TEXT"
+        assert conn.execute("SELECT MAX(Rating) FROM puzzles").fetchone()[0] == 1858
+        assert conn.execute("SELECT DISTINCT typeof(NbPlays) FROM puzzles").fetchall() == [("integer",)]
+
+
+def test_create_db_from_csv_builds_one_theme_index(built_db):
+    with closing(sqlite3.connect(built_db)) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "cpk_puzzle_themes" in tables
+    assert not any(name.startswith("puzzles_fts") for name in tables)
+
+
+def test_create_db_from_csv_indexes(built_db):
+    with closing(sqlite3.connect(built_db)) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM puzzles WHERE PuzzleId = ?", ("00008",)
+        ).fetchall()
+        assert "idx_puzzle_id" in plan[0][-1]
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM puzzles "
+            "WHERE Rating BETWEEN ? AND ? AND Popularity BETWEEN ? AND ?", (600, 700, 80, 100)
+        ).fetchall()
+        assert "COVERING INDEX idx_rating_popularity" in plan[0][-1]
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT MIN(Rating) FROM puzzles").fetchall()
+        assert plan[0][-1].startswith("SEARCH") and "COVERING INDEX" in plan[0][-1]
+
+
+def test_create_db_from_csv_empty_integer_field(tmp_path):
+    csv_path = tmp_path / "puzzles.csv"
+    csv_path.write_text("PuzzleId,Rating,Popularity,Themes\n00008,1858,,fork\n")
+    db_path = cpk.create_db_from_csv(csv_path, tmp_path / "puzzles.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT Rating, Popularity FROM puzzles").fetchone() == (1858, None)
+
+
+def test_create_db_from_csv_without_optional_columns(tmp_path):
+    csv_path = tmp_path / "puzzles.csv"
+    csv_path.write_text("PuzzleId,FEN\n00008,8/8/8/8/8/8/8/8 w - - 0 1\n")
+    db_path = cpk.create_db_from_csv(csv_path, tmp_path / "puzzles.db")
+    with closing(sqlite3.connect(db_path)) as conn:
+        assert conn.execute("SELECT * FROM cpk_puzzle_themes").fetchall() == []
+        assert conn.execute("SELECT * FROM cpk_themes").fetchall() == []
+        assert dict(conn.execute("SELECT key, value FROM cpk_metadata")) == {
+            "rating_min": None, "rating_max": None, "popularity_min": None, "popularity_max": None,
+        }
+        indexes = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'puzzles'")
+        assert indexes.fetchall() == [("idx_puzzle_id",)]
+
+
+def test_create_db_from_csv_refuses_to_overwrite(built_db, tmp_path):
+    with pytest.raises(FileExistsError):
+        cpk.create_db_from_csv(tmp_path / "puzzles.csv", built_db)
+
+
+@pytest.fixture
+def use_built_db(built_db, test_db):
+    cpk.initialize_connection(built_db)
+    yield built_db
+    cpk.initialize_connection(test_db)
+
+
+@pytest.fixture
+def use_db(tmp_path, test_db):
+    """
+    Returns a function that creates a database with `build(conn)` and makes it
+    the active one for the rest of the test.
+    """
+    def use(build):
+        db_path = tmp_path / "custom.db"
+        with closing(sqlite3.connect(db_path)) as conn:
+            build(conn)
+            conn.commit()
+        cpk.initialize_connection(db_path)
+        return db_path
+
+    yield use
+    cpk.initialize_connection(test_db)
+
+
+def test_theme_filter_uses_puzzle_themes_table(use_built_db):
+    with closing(sqlite3.connect(use_built_db)) as conn:
+        assert conn.execute(
+            "SELECT puzzle_rowid FROM cpk_puzzle_themes WHERE theme = 'mateIn2'"
+        ).fetchall() == [(6,)]
+    result = cpk.get_puzzle(themes=["mateIn2", "CRUSHING"], count=5)
+    assert {puzzle["PuzzleId"] for puzzle in result} == {"matey", "00008"}
+    # Matching is per theme, not a substring match like LIKE.
+    assert cpk.get_puzzle(themes=["mate"]) == []
+
+
+def test_create_db_from_csv_removes_partial_db(tmp_path):
+    csv_path = tmp_path / "bad.csv"
+    csv_path.write_text("PuzzleId,FEN,Rating\n00008,8/8/8/8/8/8/8/8 w - - 0 1\n")
+    db_path = tmp_path / "bad.db"
+    with pytest.raises(ValueError, match="line 2"):
+        cpk.create_db_from_csv(csv_path, db_path)
+    assert not db_path.exists()
+
+
+def _csv_extension_available():
+    with closing(sqlite3.connect(":memory:")) as conn:
+        try:
+            conn.enable_load_extension(True)
+            conn.load_extension("csv")
+            return True
+        except (AttributeError, sqlite3.Error):
+            return False
+
+
+@pytest.mark.parametrize("loader", [
+    "python",
+    pytest.param("extension", marks=pytest.mark.skipif(
+        not _csv_extension_available(), reason="SQLite csv extension cannot be loaded"
+    )),
+])
+@pytest.mark.parametrize("row", ["00008,abc", "00008,1.5", "00008", "00008,1500,extra"])
+def test_create_db_from_csv_rejects_malformed_rows(tmp_path, monkeypatch, loader, row):
+    if loader == "python":
+        monkeypatch.setattr(cpk._db, "_import_csv_with_extension", lambda *args: False)
+    csv_path = tmp_path / "bad.csv"
+    csv_path.write_text(f"PuzzleId,Rating\n00001,1500\n{row}\n")
+    db_path = tmp_path / "bad.db"
+    with pytest.raises(ValueError):
+        cpk.create_db_from_csv(csv_path, db_path)
+    assert not db_path.exists()
+
+
+def test_get_all_themes_uses_themes_table(use_built_db, sample_puzzles_df):
+    expected = set(" ".join(sample_puzzles_df["Themes"]).split())
+    with closing(sqlite3.connect(use_built_db)) as conn:
+        assert {row[0] for row in conn.execute("SELECT name FROM cpk_themes")} == expected
+    assert cpk.get_all_themes() == expected
+
+
+class _FakeResponse:
+    def __init__(self, chunks, status_code=200, headers=None, url=None):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self.url = url
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+def test_download_default_db(tmp_path, monkeypatch):
+    default_path = tmp_path / "lichess_db_puzzle.db"
+    monkeypatch.setattr(cpk._db, "DEFAULT_PATH", default_path)
+    monkeypatch.setattr(cpk._db.requests, "head", lambda url, **kwargs: _FakeResponse([], url=url))
+    monkeypatch.setattr(cpk._db.requests, "get", lambda *args, **kwargs: _FakeResponse([b"abc", b"def"]))
+    cpk.download_default_db()
+    assert default_path.read_bytes() == b"abcdef"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [default_path.name]
+
+
+def test_download_default_db_interrupted(tmp_path, monkeypatch):
+    default_path = tmp_path / "lichess_db_puzzle.db"
+    error = requests.exceptions.ChunkedEncodingError("connection reset")
+    monkeypatch.setattr(cpk._db, "DEFAULT_PATH", default_path)
+    monkeypatch.setattr(cpk._db.requests, "head", lambda url, **kwargs: _FakeResponse([], url=url))
+    monkeypatch.setattr(cpk._db.requests, "get", lambda *args, **kwargs: _FakeResponse([b"abc", error]))
+    with pytest.raises(ConnectionError, match="connection reset"):
+        cpk.download_default_db()
+    assert list(tmp_path.iterdir()) == []
+
+
+def _serve_ranges(monkeypatch, data, chunks=None):
+    """Serves `data` through fake ranged HEAD/GET requests; `chunks` overrides GET bodies."""
+    requested = []
+
+    def head(url, **kwargs):
+        headers = {"Accept-Ranges": "bytes", "Content-Length": str(len(data))}
+        return _FakeResponse([], headers=headers, url="https://storage.example/db")
+
+    def get(url, headers=None, **kwargs):
+        assert url == "https://storage.example/db"
+        start, end = map(int, headers["Range"][len("bytes="):].split("-"))
+        requested.append((start, end))
+        body = chunks if chunks is not None else [data[start:end + 1]]
+        return _FakeResponse(body, status_code=206)
+
+    monkeypatch.setattr(cpk._db, "_DOWNLOAD_CHUNK_SIZE", 4)
+    monkeypatch.setattr(cpk._db, "_DOWNLOAD_WORKERS", 3)
+    monkeypatch.setattr(cpk._db.requests, "head", head)
+    monkeypatch.setattr(cpk._db.requests, "get", get)
+    return requested
+
+
+def test_download_default_db_in_ranges(tmp_path, monkeypatch):
+    default_path = tmp_path / "lichess_db_puzzle.db"
+    data = bytes(range(32))
+    monkeypatch.setattr(cpk._db, "DEFAULT_PATH", default_path)
+    requested = _serve_ranges(monkeypatch, data)
+    cpk.download_default_db()
+    assert default_path.read_bytes() == data
+    assert sorted(requested) == [(0, 10), (11, 21), (22, 31)]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [default_path.name]
+
+
+def test_download_default_db_incomplete_range(tmp_path, monkeypatch):
+    default_path = tmp_path / "lichess_db_puzzle.db"
+    monkeypatch.setattr(cpk._db, "DEFAULT_PATH", default_path)
+    _serve_ranges(monkeypatch, bytes(range(32)), chunks=[b"ab"])
+    with pytest.raises(ConnectionError, match="Incomplete download"):
+        cpk.download_default_db()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_contiguous_sampling_uses_shuffle_table(use_built_db, monkeypatch):
+    with closing(sqlite3.connect(use_built_db)) as conn:
+        shuffled = [row[0] for row in conn.execute("SELECT puzzle_rowid FROM cpk_puzzle_shuffle ORDER BY shuffle_key")]
+        ids = dict(conn.execute('SELECT rowid, "PuzzleId" FROM puzzles'))
+    assert sorted(shuffled) == sorted(ids)
+
+    result = cpk.get_puzzle(themes=["hangingPiece"], count=2, sampling="contiguous")
+    assert len({puzzle["PuzzleId"] for puzzle in result}) == 2
+    assert all("hangingPiece" in puzzle["Themes"] for puzzle in result)
+
+    # Starting at the last shuffle_key, the run has to wrap around to the start.
+    monkeypatch.setattr(cpk.puzzles.random, "randint", lambda low, high: high)
+    result = cpk.get_puzzle(count=3, sampling="contiguous")
+    assert [puzzle["PuzzleId"] for puzzle in result] == [ids[rowid] for rowid in shuffled[-1:] + shuffled[:2]]
+
+
+def test_contiguous_sampling_ignores_unrelated_shuffle_table(use_db, sample_puzzles_df):
+    def build(conn):
+        sample_puzzles_df.to_sql("puzzles", conn, index=False)
+        conn.execute("CREATE TABLE puzzle_shuffle (puzzle_id TEXT, position INTEGER)")
+
+    use_db(build)
+    assert len(cpk.get_puzzle(count=3, sampling="contiguous")) == 3
+
+
+def test_ranges_use_metadata_table(use_built_db):
+    with closing(sqlite3.connect(use_built_db)) as conn:
+        metadata = dict(conn.execute("SELECT key, value FROM cpk_metadata"))
+    assert metadata == {
+        "rating_min": 629, "rating_max": 1858, "popularity_min": -33, "popularity_max": 97,
+    }
+    assert cpk.get_rating_range() == (629, 1858)
+    assert cpk.get_popularity_range() == (-33, 97)
+
+
+def test_ranges_ignore_unrelated_metadata_table(use_db, sample_puzzles_df):
+    def build(conn):
+        sample_puzzles_df.to_sql("puzzles", conn, index=False)
+        conn.execute("CREATE TABLE metadata (key TEXT, value TEXT)")
+        conn.execute("CREATE TABLE cpk_metadata (key TEXT, value INTEGER)")
+        conn.execute("INSERT INTO cpk_metadata VALUES ('schema_version', 3)")
+
+    use_db(build)
+    assert cpk.get_rating_range() == (629, 1858)
+
+
+def test_get_all_themes_ignores_unrelated_themes_table(use_db, sample_puzzles_df):
+    def build(conn):
+        sample_puzzles_df.to_sql("puzzles", conn, index=False)
+        conn.execute("CREATE TABLE themes (color TEXT)")
+
+    use_db(build)
+    assert cpk.get_all_themes() == set(" ".join(sample_puzzles_df["Themes"]).split())
+
+
+def test_theme_filter_ignores_unrelated_puzzle_themes_table(use_db, sample_puzzles_df):
+    def build(conn):
+        sample_puzzles_df.to_sql("puzzles", conn, index=False)
+        conn.execute("CREATE TABLE puzzle_themes (puzzle_id TEXT, theme TEXT)")
+
+    use_db(build)
+    assert [puzzle["PuzzleId"] for puzzle in cpk.get_puzzle(themes=["mateIn2"])] == ["matey"]
+    assert cpk.get_all_themes() == set(" ".join(sample_puzzles_df["Themes"]).split())
+
+
+@pytest.fixture
+def use_large_db(use_db):
+    def build(conn):
+        conn.execute('CREATE TABLE puzzles ("PuzzleId" TEXT, "Rating" INTEGER, "Themes" TEXT)')
+        conn.executemany(
+            "INSERT INTO puzzles VALUES (?, ?, ?)",
+            [(f"p{i}", 1000 if i % 2 else 2000, "fork" if i % 4 == 1 else "pin") for i in range(400)],
+        )
+
+    return use_db(build)
+
+
+@pytest.mark.parametrize("json_each", [True, False])
+def test_get_puzzle_samples_filtered_rowids(use_large_db, json_each):
+    cpk._db._db_cache()["json_each"] = json_each
+    for _ in range(20):
+        result = cpk.get_puzzle(themes=["fork"], ratingRange=(900, 1100), count=5)
+        assert len({puzzle["PuzzleId"] for puzzle in result}) == 5
+        assert all(puzzle["Rating"] == 1000 and puzzle["Themes"] == "fork" for puzzle in result)
+
+
+def test_sampled_rowids_probe_puzzle_themes_per_row(built_db):
+    filters = cpk.puzzles._puzzle_filters("sqlite3", "bridge_lookup", 1, None, None)
+    query = cpk.puzzles._rowid_sample_query(filters, None)
+    with closing(sqlite3.connect(built_db)) as conn:
+        plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, ("[1, 2]", "fork"))]
+    assert "SEARCH cpk_puzzle_themes USING PRIMARY KEY (theme=? AND puzzle_rowid=?)" in plan
+    assert any(step.startswith("CORRELATED") for step in plan)
+
+
+@pytest.mark.parametrize("schema", [
+    'CREATE TABLE puzzles ("PuzzleId" TEXT PRIMARY KEY, "Rating" INTEGER, "Themes" TEXT) WITHOUT ROWID',
+    'CREATE TABLE raw ("PuzzleId" TEXT, "Rating" INTEGER, "Themes" TEXT); '
+    "CREATE VIEW puzzles AS SELECT * FROM raw",
+])
+def test_get_puzzle_without_rowids(use_db, schema):
+    def build(conn):
+        conn.executescript(schema)
+        table = "raw" if "VIEW" in schema else "puzzles"
+        conn.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?)",
+            [(f"p{i}", 1000 + i, "fork" if i % 2 else "pin") for i in range(10)],
+        )
+
+    use_db(build)
+    assert len(cpk.get_puzzle()) == 1
+    result = cpk.get_puzzle(themes=["fork"], count=3)
+    assert len({puzzle["PuzzleId"] for puzzle in result}) == 3
+    assert all(puzzle["Themes"] == "fork" for puzzle in result)
+
@@ -70,6 +70,34 @@ def test_get_puzzle_with_themes():
     assert puzzle["PuzzleId"] == "matey"
 
 
+def test_get_puzzle_with_several_themes():
+    result = cpk.get_puzzle(themes=["MATEIN2", "crushing"], count=10)
+    assert {puzzle["PuzzleId"] for puzzle in result} == {"00008", "matey"}
+    # Without theme tables, themes match as substrings, like ILIKE on PostgreSQL.
+    assert [puzzle["PuzzleId"] for puzzle in cpk.get_puzzle(themes=["mate"])] == ["matey"]
+
+
+def test_get_puzzle_with_theme_tuple():
+    result = cpk.get_puzzle(themes=("mateIn2",))
+    assert result[0]["PuzzleId"] == "matey"
+
+
+def test_get_puzzle_with_invalid_themes():
+    with pytest.raises(TypeError, match="Themes must be a list of strings"):
+        cpk.get_puzzle(themes="mateIn2")
+
+    with pytest.raises(TypeError, match="Themes must be a list of strings"):
+        cpk.get_puzzle(themes=["mateIn2", 2])
+
+
+def test_get_puzzle_with_combined_filters():
+    result = cpk.get_puzzle(
+        themes=["hangingPiece"], ratingRange=(600, 1000), popularityRange=(85, 100), count=10
+    )
+    # 0003h matches the theme and rating but not the popularity range.
+    assert {p["PuzzleId"] for p in result} == {"0003b", "matey"}
+
+
 def test_get_puzzle_with_count():
     result = cpk.get_puzzle(count=5)
     assert isinstance(result, list)
@@ -87,6 +115,20 @@ def test_get_puzzle_with_invalid_count():
         cpk.get_puzzle(count=0)
 
 
+def test_get_puzzle_with_numpy_integers():
+    np = pytest.importorskip("numpy")
+    result = cpk.get_puzzle(ratingRange=(np.int64(1800), np.int64(1900)), count=np.int64(2))
+    assert [puzzle["PuzzleId"] for puzzle in result] == ["00008"]
+
+
+def test_get_puzzle_rejects_bools():
+    with pytest.raises(ValueError, match="Count must be a positive integer"):
+        cpk.get_puzzle(count=True)
+
+    with pytest.raises(TypeError, match="ratingRange must be"):
+        cpk.get_puzzle(ratingRange=(False, True))
+
+
 def test_write_puzzles_to_file(tmp_path):
     result = cpk.get_puzzle(count=3)
     file_path = tmp_path / "test_puzzles.csv"
@@ -113,4 +155,94 @@ def test_get_puzzle_attributes(sample_puzzles_df):
     attributes = cpk.get_puzzle_attributes()
     assert isinstance(attributes, set)
     expected_attributes = set(sample_puzzles_df.columns)
-    assert attributes == expected_attributes
\ No newline at end of file
+    assert attributes == expected_attributes
+
+
+def test_get_puzzle_default_covers_all_puzzles(sample_puzzles_df):
+    seen = {cpk.get_puzzle()[0]["PuzzleId"] for _ in range(200)}
+    assert seen == set(sample_puzzles_df["PuzzleId"])
+
+
+def test_get_puzzle_returns_distinct_puzzles():
+    for _ in range(20):
+        result = cpk.get_puzzle(count=3)
+        assert len(result) == 3
+        assert len({puzzle["PuzzleId"] for puzzle in result}) == 3
+
+
+def test_get_puzzle_count_exceeding_matches():
+    result = cpk.get_puzzle(ratingRange=(600, 1000), count=10)
+    assert {puzzle["PuzzleId"] for puzzle in result} == {"0003h", "0003b", "matey", "0005D"}
+
+
+def test_write_puzzles_to_file_mixed_keys(tmp_path):
+    file_path = tmp_path / "mixed.csv"
+    cpk.write_puzzles_to_file([{"PuzzleId": "a"}, {"PuzzleId": "b", "Rating": 1500}], file_path)
+    df = pd.read_csv(file_path)
+    assert list(df.columns) == ["PuzzleId", "Rating"]
+    assert df["PuzzleId"].tolist() == ["a", "b"]
+
+
+def test_write_puzzles_to_file_without_header(tmp_path):
+    file_path = tmp_path / "no_header.csv"
+    cpk.write_puzzles_to_file(cpk.get_puzzle(count=2), file_path, header=False)
+    assert len(file_path.read_text().splitlines()) == 2
+
+
+def test_iter_puzzle_raw(sample_puzzles_df):
+    rows = cpk.iter_puzzle_raw('SELECT "PuzzleId" FROM puzzles ORDER BY rowid', chunksize=4)
+    assert not isinstance(rows, list)
+    assert [row["PuzzleId"] for row in rows] == sample_puzzles_df["PuzzleId"].tolist()
+
+
+def test_get_puzzle_contiguous_sampling(sample_puzzles_df):
+    ids = sample_puzzles_df["PuzzleId"].tolist()
+    result = cpk.get_puzzle(count=3, sampling="contiguous")
+    result_ids = [puzzle["PuzzleId"] for puzzle in result]
+    start = ids.index(result_ids[0])
+    assert result_ids == ids[start:start + 3]
+
+    result = cpk.get_puzzle(ratingRange=(600, 1000), count=2, sampling="contiguous")
+    assert len(result) == 2
+    assert all(600 <= puzzle["Rating"] <= 1000 for puzzle in result)
+
+
+def test_get_puzzle_with_invalid_sampling():
+    with pytest.raises(ValueError, match="sampling must be"):
+        cpk.get_puzzle(sampling="random")
+
+
+def test_iter_puzzle():
+    puzzles = cpk.iter_puzzle(ratingRange=(600, 1000), count=10)
+    assert not isinstance(puzzles, list)
+    assert {puzzle["PuzzleId"] for puzzle in puzzles} == {"0003b", "0003h", "0005D", "matey"}
+
+
+def test_iter_puzzle_validates_immediately():
+    with pytest.raises(ValueError, match="Count must be a positive integer"):
+        cpk.iter_puzzle(count=0)
+
+
+def test_write_puzzles_to_file_from_iterator(tmp_path, sample_puzzles_df):
+    file_path = tmp_path / "streamed.csv"
+    cpk.write_puzzles_to_file(cpk.iter_puzzle(count=10), file_path)
+    df = pd.read_csv(file_path)
+    assert list(df.columns) == list(sample_puzzles_df.columns)
+    assert sorted(df["PuzzleId"]) == sorted(sample_puzzles_df["PuzzleId"])
+
+
+def test_write_puzzles_to_file_from_rows(tmp_path):
+    with cpk.borrow_connection() as conn:
+        rows = conn.execute('SELECT "PuzzleId", "Rating" FROM puzzles ORDER BY "Rating"').fetchall()
+    assert rows[0]["PuzzleId"] == "0003h"
+    file_path = tmp_path / "rows.csv"
+    cpk.write_puzzles_to_file(rows, file_path)
+    df = pd.read_csv(file_path)
+    assert list(df.columns) == ["PuzzleId", "Rating"]
+    assert df["Rating"].tolist() == sorted(df["Rating"])
+
+
+def test_get_all_themes_returns_a_copy():
+    themes = cpk.get_all_themes()
+    themes.add("notATheme")
+    assert "notATheme" not in cpk.get_all_themes()
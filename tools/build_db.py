@@ -0,0 +1,59 @@
+"""
+Builds the release copy of the puzzle database from a Lichess puzzle CSV.
+
+The database is built with `create_db_from_csv` (typed columns, indexes, the
+theme, metadata and shuffle tables, ANALYZE statistics), then rewritten with
+VACUUM INTO using a larger page size, so the published file is compact and its
+B-trees are laid out for sequential reads. Users download the result and never build it themselves.
+
+Usage (with the package installed, e.g. `pip install -e .`):
+    python tools/build_db.py lichess_db_puzzle.csv lichess_db_puzzle.db
+"""
+import argparse
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from ChessPuzzleKit import create_db_from_csv
+
+# Larger pages mean fewer reads per range scan over the puzzles table.
+PAGE_SIZE = 16384
+
+
+def build_release_db(csv_path, output_path):
+    """
+    Builds a compacted, fully indexed puzzle database at `output_path`.
+
+    Args:
+        csv_path (str or Path): Path to the Lichess puzzle CSV export.
+        output_path (str or Path): Path of the database file to create.
+
+    Returns:
+        Path: The path of the created database.
+    """
+    output_path = Path(output_path)
+    if output_path.exists():
+        raise FileExistsError(f"Refusing to overwrite existing file at '{output_path}'.")
+
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as tmp_dir:
+        staging_path = create_db_from_csv(csv_path, Path(tmp_dir) / "staging.db")
+        conn = sqlite3.connect(staging_path, isolation_level=None)
+        try:
+            # The page size of the VACUUM INTO copy follows the source connection.
+            conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+            conn.execute("VACUUM INTO ?", (str(output_path),))
+        finally:
+            conn.close()
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("csv_path", help="Lichess puzzle CSV export")
+    parser.add_argument("output_path", help="database file to create")
+    args = parser.parse_args()
+    print(f"Built {build_release_db(args.csv_path, args.output_path)}")
+
+
+if __name__ == "__main__":
+    main()